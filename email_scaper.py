@@ -1,106 +1,289 @@
 import pandas as pd
 import asyncio
+import csv
 import httpx
 import re
 import logging
 import os
-from typing import List, Set
+from typing import Dict, List
+from urllib.parse import urlparse
+from abloom import BloomFilter
+
+try:
+    import hyperscan  # Optional: SIMD regex scanning; wheels only exist for some platforms
+except ImportError:
+    hyperscan = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Compiled once at import; runs on raw response bytes so the page is never decoded
+_EMAIL_PATTERN = rb'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,24}\b'
+_EMAIL_RE = re.compile(_EMAIL_PATTERN)
+# Runs of characters allowed before / after the '@', used to spot windows that cut an address
+_LOCAL_RUN_RE = re.compile(rb'[A-Za-z0-9._%+-]+')
+_DOMAIN_RUN_RE = re.compile(rb'[A-Za-z0-9.-]+')
+if hyperscan is not None:
+    _EMAIL_DB = hyperscan.Database()
+    _EMAIL_DB.compile(expressions=[_EMAIL_PATTERN], ids=[0], flags=[hyperscan.HS_FLAG_SOM_LEFTMOST])
+else:
+    _EMAIL_DB = None
+# Asset filenames like logo@2x.png look like emails to the regex
+IMG_EXTS = (b'.png', b'.jpg', b'.jpeg', b'.gif')
+MAX_CONCURRENT_REQUESTS = 20
+MIN_HOST_INTERVAL = 1.0  # Seconds between requests to the same host
+# The seen-emails filter is sized per run: previously saved emails plus room for new
+# ones, never below the floor (~0.3 MB at this FP rate)
+SEEN_EMAILS_MIN_CAPACITY = 50_000
+SEEN_EMAILS_PER_SITE = 10
+SEEN_EMAILS_FP_RATE = 1e-6
+# Bytes scanned either side of each '@' (RFC 5321 caps the local part at 64)
+EMAIL_WINDOW_BEFORE = 64
+EMAIL_WINDOW_AFTER = 128
+# Pages with an '@' every N bytes or more often (CSS @media, @font-face...) are faster
+# to scan in one whole-page pass than window by window
+EMAIL_WINDOW_MIN_SPACING = 256
+
+def find_emails(data: bytes) -> List[bytes]:
+    """Find email-like byte strings in a page"""
+    if b'@' not in data:
+        return []
+    return _find_emails_re(data)
+
+def _find_emails_whole_page(data: bytes) -> List[bytes]:
+    """Scan the whole page in one pass, with Hyperscan when it is installed
+
+    Returns the same matches as _EMAIL_RE.findall(data) either way.
+    """
+    if _EMAIL_DB is None:
+        return _EMAIL_RE.findall(data)
+
+    # Hyperscan reports each end offset with its leftmost start; keep the longest span
+    # per start. Spans that begin inside the previous match are where findall restarts
+    # mid-run, so re is only run from the end of the previous match in that (rare) case.
+    longest = {}
+
+    def on_match(_id, start, end, _flags, _ctx):
+        if end > longest.get(start, -1):
+            longest[start] = end
+
+    _EMAIL_DB.scan(data, match_event_handler=on_match)
+
+    matches = []
+    pos = 0
+    for start in sorted(longest):
+        end = longest[start]
+        if start >= pos:
+            matches.append(data[start:end])
+            pos = end
+        elif end > pos:
+            match = _EMAIL_RE.search(data, pos)
+            if match is None:
+                break
+            matches.append(match.group())
+            pos = match.end()
+    return matches
+
+def _find_emails_re(data: bytes) -> List[bytes]:
+    """Run the email regex only on small windows around each '@' in the page
+
+    Returns the same matches as _EMAIL_RE.findall(data), falling back to a whole-page
+    scan when '@' is dense or an address runs past a window edge.
+    """
+    size = len(data)
+    if data.count(b'@') > size // EMAIL_WINDOW_MIN_SPACING:
+        return _find_emails_whole_page(data)
+
+    matches = []
+    prev_end = 0
+    start = data.find(b'@')
+    while start != -1:
+        lo = max(prev_end, start - EMAIL_WINDOW_BEFORE)
+        hi = min(size, start + EMAIL_WINDOW_AFTER)
+        if ((lo > prev_end and _LOCAL_RUN_RE.fullmatch(data, lo - 1, start))
+                or (hi < size and _DOMAIN_RUN_RE.fullmatch(data, start + 1, hi))):
+            return _find_emails_whole_page(data)
+
+        # pos/endpos instead of slicing keeps \b honest at the left edge
+        next_from = start + 1
+        for match in _EMAIL_RE.finditer(data, lo, hi):
+            if match.start() <= start < match.end():
+                matches.append(match.group())
+                next_from = prev_end = match.end()
+                break
+        start = data.find(b'@', next_from)
+    return matches
 
 class EmailScraper:
     def __init__(self):
         self.setup_logging()
-        self.seen_emails: Set[str] = set()  # Store lowercase emails for comparison
+        # Bloom filter of lowercase emails; process_websites resizes it for the resume file
+        self.seen_emails = BloomFilter(SEEN_EMAILS_MIN_CAPACITY, SEEN_EMAILS_FP_RATE)
+        # Per-host politeness: different domains are fetched in parallel
+        self.host_locks: Dict[str, asyncio.Lock] = {}
+        self.last_fetch: Dict[str, float] = {}
+        # One pooled client for every website instead of a new connection per URL
+        self.client = httpx.AsyncClient(
+            timeout=10.0,
+            follow_redirects=True,
+            http2=True,  # Requests to the same host share one multiplexed connection
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=30
+            )
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.client.aclose()
 
     def setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
         self.logger = logging.getLogger(__name__)
 
     def normalize_email(self, email: str) -> str:
         """Normalize email by converting to lowercase for comparison"""
         return email.lower().strip()
 
-    def is_unique_email(self, email: str) -> bool:
-        """Check if email is unique (case-insensitive)"""
-        normalized = self.normalize_email(email)
-        if normalized in self.seen_emails:
-            return False
-        self.seen_emails.add(normalized)
-        return True
-
     def process_emails(self, emails: List[str]) -> List[str]:
-        """Process and filter unique emails while preserving original case"""
+        """Process and filter unique emails (case-insensitive) while preserving original case"""
+        # Locals skip attribute lookups in the loop. BloomFilter.add both checks and
+        # inserts, returning False when the key was (probably) already present
+        normalize = self.normalize_email
+        seen_add = self.seen_emails.add
         unique_emails = []
         for email in emails:
-            if self.is_unique_email(email):
+            if seen_add(normalize(email)):
                 unique_emails.append(email)  # Keep original case
         return unique_emails
 
+    async def _respect_rate(self, host: str, sem: asyncio.Semaphore, min_interval: float = MIN_HOST_INTERVAL):
+        """Wait out host's rate limit, then acquire sem for the request
+
+        Rows for the same host queue on the host lock without holding a slot of sem,
+        so a common host can't starve every other host.
+        """
+        lock = self.host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            wait = self.last_fetch.get(host, float('-inf')) + min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await sem.acquire()
+            self.last_fetch[host] = loop.time()
+
     async def scrape_email_from_website(self, website: str) -> List[str]:
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
         emails = []
 
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            try:
-                response = await client.get(website)
-                response.raise_for_status()
-                found_emails = re.findall(email_pattern, response.text)
+        try:
+            response = await self.client.get(website)
+            response.raise_for_status()
+            found_emails = find_emails(response.content)
 
-                # Filter out invalid emails and process unique ones
-                valid_emails = [
-                    email for email in found_emails
-                    if '.' in email.split('@')[1]
-                    and not email.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
-                ]
+            # Filter out invalid emails while still in bytes, then decode only the survivors
+            valid_emails = []
+            for email in found_emails:
+                if b'.' not in email.rpartition(b'@')[2]:
+                    continue
+                if email.lower().endswith(IMG_EXTS):
+                    continue
+                valid_emails.append(email.decode('ascii', 'ignore'))
 
-                # Process unique emails
-                emails = self.process_emails(valid_emails)
+            # Process unique emails
+            emails = self.process_emails(valid_emails)
 
-            except Exception as e:
-                self.logger.error(f"Error scraping {website}: {e}")
+        except Exception as e:
+            self.logger.error("Error scraping %s: %s", website, e)
 
         return emails
 
     async def process_websites(self, df: pd.DataFrame, output_file: str):
-        results = []
+        existing_header = None
+        existing_emails = pd.Series(dtype=str)
 
         # Load existing emails if output file exists
-        if os.path.exists(output_file):
+        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
             existing_df = pd.read_csv(output_file)
+            with open(output_file, newline='', encoding='utf-8') as f:
+                existing_header = next(csv.reader(f))
             if 'emails' in existing_df.columns:
-                existing_emails = existing_df['emails'].dropna()
-                for email_list in existing_emails:
-                    if isinstance(email_list, str):
-                        for email in email_list.split(', '):
-                            self.seen_emails.add(self.normalize_email(email))
+                # Split, flatten and normalize with pandas string ops instead of nested loops
+                existing_emails = (
+                    existing_df['emails'].dropna().astype(str)
+                    .str.split(', ').explode().dropna()
+                    .str.lower().str.strip()
+                )
+
+        # Size the filter for this run unless earlier calls already filled it
+        if not self.seen_emails:
+            capacity = max(
+                SEEN_EMAILS_MIN_CAPACITY,
+                len(existing_emails) + len(df) * SEEN_EMAILS_PER_SITE
+            )
+            self.seen_emails = BloomFilter(capacity, SEEN_EMAILS_FP_RATE)
+        self.seen_emails.update(existing_emails.to_numpy())
+
+        sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        # Plain dicts per row instead of building a pd.Series for each one
+        websites = df['website'].to_numpy()
+        records = df.to_dict('records')
 
-        for index, row in df.iterrows():
-            if pd.notna(row['website']):
-                self.logger.info(f"Processing {row['name']} - {row['website']}")
-                emails = await self.scrape_email_from_website(row['website'])
+        columns = list(df.columns)
+        if 'emails' not in columns:
+            columns.append('emails')
 
-                new_row = row.to_dict()
-                new_row['emails'] = ', '.join(emails) if emails else 'N/A'
-                results.append(new_row)
+        if existing_header is None:
+            fieldnames = columns
+        else:
+            # Append in the existing file's column order so rows stay aligned with its header
+            fieldnames = existing_header
+            missing = [column for column in columns if column not in fieldnames]
+            if missing:
+                self.logger.warning("Columns %s are not in %s's header and will not be written", missing, output_file)
 
-                self.logger.info(f"Found {len(emails)} unique emails for {row['name']}")
-                self.save_row_to_csv(new_row, output_file)
+        # Keep one handle open for the whole run
+        with open(output_file, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            if existing_header is None:
+                writer.writeheader()
 
-            await asyncio.sleep(1)
+            tasks = [
+                asyncio.create_task(self._scrape_with_sem(sem, row))
+                for row, website in zip(records, websites)
+                if website is not None and website == website  # NaN != NaN
+            ]
+            try:
+                # Tasks run concurrently, but rows are written in input order as soon as
+                # every earlier row has finished
+                for task in tasks:
+                    writer.writerow(await task)
+                    f.flush()
+            finally:
+                for task in tasks:
+                    task.cancel()
 
-        # Final save
-        result_df = pd.DataFrame(results)
-        result_df.to_csv(output_file, index=False)
+    async def _scrape_with_sem(self, sem: asyncio.Semaphore, row: dict) -> dict:
+        try:
+            host = urlparse(str(row['website'])).netloc
+        except ValueError:
+            host = ''
+        await self._respect_rate(host, sem)
+        try:
+            self.logger.info("Processing %s - %s", row['name'], row['website'])
+            emails = await self.scrape_email_from_website(row['website'])
 
-    def save_row_to_csv(self, row: dict, output_file: str):
-        row_df = pd.DataFrame([row])
+            # Write missing values as empty cells, like DataFrame.to_csv did
+            new_row = {key: '' if value != value else value for key, value in row.items()}
+            new_row['emails'] = ', '.join(emails) if emails else 'N/A'
 
-        if not os.path.exists(output_file):
-            row_df.to_csv(output_file, index=False)
-        else:
-            row_df.to_csv(output_file, mode='a', header=False, index=False)
+            self.logger.info("Found %d unique emails for %s", len(emails), row['name'])
+            return new_row
+        finally:
+            sem.release()
 
 async def main():
     input_file = input("Enter the path to the CSV file (or press Enter to use default 'gmaps_data.csv'): ").strip()
@@ -115,8 +298,8 @@ async def main():
 
         print(f"Found {len(df_with_websites)} entries with websites to process")
 
-        scraper = EmailScraper()
-        await scraper.process_websites(df_with_websites, output_file)
+        async with EmailScraper() as scraper:
+            await scraper.process_websites(df_with_websites, output_file)
 
         print(f"Results saved to {output_file}")
 
@@ -7,33 +7,131 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 import asyncio
+import httpx
+import json
 import os
-from typing import Dict, Set, Tuple
+import re
+import struct
+from typing import Dict, Optional, Tuple
 from urllib.parse import quote
+from abloom import BloomFilter
+import lxml.html
+from lxml.cssselect import CSSSelector
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
 
 # Constants
 CSV_FILENAME = 'gmaps_data.csv'
+SEEN_FILENAME = '.seen.bloom'  # Serialized Bloom filter of places already in CSV_FILENAME
+# Prefix of SEEN_FILENAME: CSV_FILENAME's size and mtime when the filter was saved
+SEEN_HEADER = struct.Struct('<QQ')
+SEEN_PLACES_CAPACITY = 1_000_000
+SEEN_PLACES_FP_RATE = 1e-7
+SEEN_SAVE_INTERVAL = 1000  # Persist the Bloom filter every N saved places
 SCROLL_PAUSE_TIME = 1.5  # Reduced pause time for better performance
 MAX_RETRIES = 3
 WAIT_FOR_NEW_RESULTS = 10
 SCROLL_INCREMENT = 500  # Pixels to scroll each time
+MAX_CONCURRENT_FETCHES = 10  # Place pages fetched in parallel per batch of cards
+CSV_FLUSH_INTERVAL = 10  # Flush the open CSV file every N saved places
+# Returns only the result cards after the given index, in one WebDriver round-trip
+NEW_CARDS_SCRIPT = "return Array.from(document.querySelectorAll('div.Nv2PK')).slice(arguments[0])"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+# Place pages embed their data as JSON in window.APP_INITIALIZATION_STATE
+_APP_STATE_RE = re.compile(r'window\.APP_INITIALIZATION_STATE=(.*?);window\.APP_FLAGS', re.S)
+# Place URLs carry the coordinates as !3d<lat>!4d<lng>
+_PLACE_COORD_RE = re.compile(r'!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)')
+# The browser URL after opening a place carries the map centre as @<lat>,<lng>
+_COORD_RE = re.compile(r'@(-?\d+\.\d+),(-?\d+\.\d+)')
+# Result card fields, matched locally against the card's outerHTML
+_CARD_NAME = CSSSelector('div.qBF1Pd')
+_CARD_ADDRESS = CSSSelector('div.W4Efsd:last-child')
+_CARD_RATING = CSSSelector('span.MW4etd')
+_CARD_REVIEWS = CSSSelector('span.UY7F9')
+_CARD_LINK = CSSSelector('a.hfpxzc')
+
+def _dig(data, *path):
+    """Walk nested lists by index, returning None if any step is missing"""
+    for index in path:
+        try:
+            data = data[index]
+        except (IndexError, KeyError, TypeError):
+            return None
+    return data
+
+# Elements that start a new line in WebElement.text
+_BLOCK_TAGS = frozenset({
+    'address', 'article', 'br', 'div', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'header', 'li', 'ol', 'p', 'section', 'table', 'tr', 'ul'
+})
+
+def _element_text(element) -> str:
+    """Rendered-style text like Selenium's WebElement.text: block elements on their own
+    lines, runs of whitespace collapsed to one space, blank lines dropped"""
+    parts = []
+
+    def walk(el):
+        block = el.tag in _BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        if el.text:
+            parts.append(el.text)
+        for child in el:
+            if isinstance(child.tag, str):  # Skip comments and processing instructions
+                walk(child)
+            if child.tail:
+                parts.append(child.tail)
+        if block:
+            parts.append('\n')
+
+    walk(element)
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+def _format_rating(value) -> str:
+    """Ratings as one-decimal text ('4.5'), whether parsed from a card or a place page"""
+    if isinstance(value, (int, float)):
+        return f'{value:.1f}'
+    return str(value).strip().replace(',', '.')
+
+def _format_reviews(value) -> str:
+    """Review counts as plain digits ('1234'), without the card's '(1,234)' punctuation"""
+    if isinstance(value, int):
+        return str(value)
+    return str(value).strip().strip('()').replace(',', '')
+
+def _place_key(name: str, address: str) -> bytes:
+    return f'{name}|{address}'.encode()
 
 class GoogleMapsExtractor:
     def __init__(self, driver):
         self.driver = driver
         self.setup_logging()
         self.setup_files()
-        self.seen_places: Set[Tuple[str, str]] = set()
+        # Copied for each card rather than rebuilding the dict every time
+        self._details_template = {field: 'N/A' for field in self.headers}
         self.total_extracted = 0
         self.last_processed_index = 0
+        # Place pages are fetched directly instead of clicking through each card
+        self.client = httpx.AsyncClient(
+            timeout=10.0,
+            follow_redirects=True,
+            headers={'User-Agent': USER_AGENT, 'Accept-Language': 'en'}
+        )
+
+    async def close(self):
+        try:
+            await self.client.aclose()
+        finally:
+            self._csv_fh.close()
+            self.save_seen_places()
 
     def setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
         self.logger = logging.getLogger(__name__)
 
     def setup_files(self):
@@ -43,28 +141,67 @@ class GoogleMapsExtractor:
         ]
 
         if not os.path.exists(CSV_FILENAME):
+            self.seen_places = BloomFilter(SEEN_PLACES_CAPACITY, SEEN_PLACES_FP_RATE, serializable=True)
             with open(CSV_FILENAME, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.DictWriter(f, fieldnames=self.headers)
                 writer.writeheader()
         else:
+            # Loading the saved filter avoids re-parsing the whole CSV on every start
+            self.seen_places = self.load_seen_places()
+
+        if self.seen_places is None:
+            # The CSV changed since the filter was saved (edited, replaced, or rows
+            # written after the last checkpoint before a crash), so rebuild from it
+            self.seen_places = BloomFilter(SEEN_PLACES_CAPACITY, SEEN_PLACES_FP_RATE, serializable=True)
             with open(CSV_FILENAME, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
                 for row in reader:
-                    self.seen_places.add((row['name'], row['address']))
+                    self.seen_places.add(_place_key(row['name'], row['address']))
+
+        # Keep one handle open for the extractor's lifetime instead of reopening per place
+        self._csv_fh = open(CSV_FILENAME, 'a', newline='', encoding='utf-8', buffering=8192)
+        self._csv_writer = csv.DictWriter(self._csv_fh, fieldnames=self.headers)
+
+    def load_seen_places(self) -> Optional[BloomFilter]:
+        """Return the saved filter, or None if it is missing or doesn't match CSV_FILENAME"""
+        try:
+            with open(SEEN_FILENAME, 'rb') as f:
+                data = f.read()
+            size, mtime_ns = SEEN_HEADER.unpack_from(data)
+            stat = os.stat(CSV_FILENAME)
+            if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                return None
+            return BloomFilter.from_bytes(data[SEEN_HEADER.size:])
+        except (OSError, struct.error, ValueError):
+            return None
+
+    def save_seen_places(self):
+        if not self._csv_fh.closed:
+            self._csv_fh.flush()
+        stat = os.stat(CSV_FILENAME)
+
+        # Write then rename so an interrupted save never leaves a truncated filter
+        tmp_filename = SEEN_FILENAME + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(SEEN_HEADER.pack(stat.st_size, stat.st_mtime_ns))
+            f.write(self.seen_places.to_bytes())
+        os.replace(tmp_filename, SEEN_FILENAME)
 
     def save_place(self, place_data: Dict):
-        place_key = (place_data['name'], place_data['address'])
+        place_key = _place_key(place_data['name'], place_data['address'])
         if place_key in self.seen_places:
-            self.logger.debug(f"Skipping duplicate: {place_data['name']}")
+            self.logger.debug("Skipping duplicate: %s", place_data['name'])
             return False
 
-        with open(CSV_FILENAME, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.headers)
-            writer.writerow(place_data)
+        self._csv_writer.writerow(place_data)
 
         self.seen_places.add(place_key)
         self.total_extracted += 1
-        self.logger.info(f"Saved place {self.total_extracted}: {place_data['name']}")
+        if self.total_extracted % CSV_FLUSH_INTERVAL == 0:
+            self._csv_fh.flush()
+        if self.total_extracted % SEEN_SAVE_INTERVAL == 0:
+            self.save_seen_places()
+        self.logger.info("Saved place %d: %s", self.total_extracted, place_data['name'])
         return True
 
     def wait_for_element(self, by, value, timeout=10):
@@ -73,35 +210,41 @@ class GoogleMapsExtractor:
                 EC.presence_of_element_located((by, value))
             )
         except TimeoutException:
-            self.logger.warning(f"Element not found: {value}")
+            self.logger.warning("Element not found: %s", value)
             return None
 
-    async def extract_basic_info(self, card):
+    async def extract_basic_info(self, card) -> Tuple[Optional[Dict], Optional[str]]:
+        """Return the card's basic details and place link, parsed from one outerHTML fetch"""
         try:
-            details = {field: 'N/A' for field in self.headers}
-            details['extracted_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            html = self.driver.execute_script("return arguments[0].outerHTML", card)
+        except StaleElementReferenceException:
+            return None, None
 
-            name_element = card.find_element(By.CSS_SELECTOR, 'div.qBF1Pd')
-            details['name'] = name_element.text.strip()
+        tree = lxml.html.fromstring(html)
+        name_elements = _CARD_NAME(tree)
+        if not name_elements:
+            return None, None
 
-            try:
-                address_element = card.find_element(By.CSS_SELECTOR, 'div.W4Efsd:last-child')
-                details['address'] = address_element.text.strip()
-            except NoSuchElementException:
-                details['address'] = 'N/A'
+        details = self._details_template.copy()
+        details['extracted_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        details['name'] = _element_text(name_elements[0])
 
-            try:
-                rating_element = card.find_element(By.CSS_SELECTOR, 'span.MW4etd')
-                details['rating'] = rating_element.text.strip()
-                
-                reviews_element = card.find_element(By.CSS_SELECTOR, 'span.UY7F9')
-                details['reviews'] = reviews_element.text.replace('(', '').replace(')', '')
-            except NoSuchElementException:
-                pass
+        address_elements = _CARD_ADDRESS(tree)
+        if address_elements:
+            details['address'] = _element_text(address_elements[0])
 
-            return details
-        except (NoSuchElementException, StaleElementReferenceException):
-            return None
+        rating_elements = _CARD_RATING(tree)
+        if rating_elements:
+            details['rating'] = _format_rating(_element_text(rating_elements[0]))
+
+            reviews_elements = _CARD_REVIEWS(tree)
+            if reviews_elements:
+                details['reviews'] = _format_reviews(_element_text(reviews_elements[0]))
+
+        link_elements = _CARD_LINK(tree)
+        url = link_elements[0].get('href') if link_elements else None
+
+        return details, url
 
     async def extract_detailed_info(self, details):
         try:
@@ -124,56 +267,125 @@ class GoogleMapsExtractor:
                     pass
 
             # Extract coordinates from URL
-            try:
-                url = self.driver.current_url
-                coords = url.split('@')[1].split(',')[:2]
-                details['latitude'] = coords[0]
-                details['longitude'] = coords[1]
-            except:
-                pass
+            coords = _COORD_RE.search(self.driver.current_url)
+            if coords:
+                details['latitude'], details['longitude'] = coords.group(1), coords.group(2)
 
             return details
 
         except Exception as e:
-            self.logger.error(f"Error extracting detailed info: {e}")
+            self.logger.error("Error extracting detailed info: %s", e)
             return details
 
-    async def extract_place_details(self, card):
+    def parse_place_page(self, html: str, details: Dict) -> Optional[Dict]:
+        match = _APP_STATE_RE.search(html)
+        if not match:
+            return None
+
         try:
-            # First get basic info without clicking
-            details = await self.extract_basic_info(card)
-            if not details:
-                return None
+            state = json.loads(match.group(1))
+            # The place payload is a JSON string prefixed with the )]}' XSSI guard
+            place = _dig(json.loads(_dig(state, 3, 6)[5:]), 6)
+        except (TypeError, ValueError):
+            return None
+        if not place:
+            return None
 
-            # Check if already seen
-            place_key = (details['name'], details['address'])
-            if place_key in self.seen_places:
-                return None
+        fields = {
+            'address': _dig(place, 39),
+            'phone': _dig(place, 178, 0, 0),
+            'website': _dig(place, 7, 0),
+            'rating': _dig(place, 4, 7),
+            'reviews': _dig(place, 4, 8),
+            'latitude': _dig(place, 9, 2),
+            'longitude': _dig(place, 9, 3)
+        }
+        formatters = {'rating': _format_rating, 'reviews': _format_reviews}
+        for field, value in fields.items():
+            if value is not None:
+                details[field] = formatters.get(field, str)(value)
+        return details
+
+    async def fetch_place_details(self, url: str, details: Dict) -> Optional[Dict]:
+        """Fetch a place page over HTTP and parse its embedded data; None means fall back to clicking"""
+        coords = _PLACE_COORD_RE.search(url)
+        if coords:
+            details['latitude'], details['longitude'] = coords.group(1), coords.group(2)
 
-            # Click card to get detailed info
-            try:
-                card.click()
-                await asyncio.sleep(1)
-                
-                details = await self.extract_detailed_info(details)
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.logger.warning("Error fetching place page for %s: %s", details['name'], e)
+            return None
 
-                # Go back to results
-                back_button = self.driver.find_element(By.CSS_SELECTOR, 'button[jsaction="pane.back"]')
-                back_button.click()
-                await asyncio.sleep(0.5)
+        return self.parse_place_page(response.text, details)
 
-            except Exception as e:
-                self.logger.error(f"Error during card interaction: {e}")
-                try:
-                    self.driver.find_element(By.CSS_SELECTOR, 'button[jsaction="pane.back"]').click()
-                except:
-                    pass
+    async def click_place_details(self, card, details):
+        """Fallback for places whose page couldn't be fetched: open the card in the browser"""
+        try:
+            card.click()
+            await asyncio.sleep(1)
 
-            return details
+            details = await self.extract_detailed_info(details)
+
+            # Go back to results
+            back_button = self.driver.find_element(By.CSS_SELECTOR, 'button[jsaction="pane.back"]')
+            back_button.click()
+            await asyncio.sleep(0.5)
 
         except Exception as e:
-            self.logger.error(f"Error in extract_place_details: {e}")
+            self.logger.error("Error during card interaction: %s", e)
+            try:
+                self.driver.find_element(By.CSS_SELECTOR, 'button[jsaction="pane.back"]').click()
+            except:
+                pass
+
+        return details
+
+    async def _fetch_with_sem(self, sem: asyncio.Semaphore, url: Optional[str], details: Dict) -> Optional[Dict]:
+        if not url:
             return None
+        async with sem:
+            try:
+                return await self.fetch_place_details(url, details)
+            except Exception as e:
+                self.logger.error("Error in fetch_place_details: %s", e)
+                return None
+
+    async def process_cards(self, cards) -> int:
+        """Extract and save a batch of cards, fetching their place pages concurrently
+
+        Returns the number of places saved.
+        """
+        # Selenium drives a single browser session, so basic info is read card by card
+        pending = []
+        for card in cards:
+            try:
+                details, url = await self.extract_basic_info(card)
+            except Exception as e:
+                self.logger.error("Error in extract_basic_info: %s", e)
+                continue
+            if not details:
+                continue
+
+            # Check if already seen
+            if _place_key(details['name'], details['address']) in self.seen_places:
+                continue
+            pending.append((card, details, url))
+
+        sem = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        results = await asyncio.gather(*[
+            self._fetch_with_sem(sem, url, details) for _, details, url in pending
+        ])
+
+        saved = 0
+        for (card, details, _), place_data in zip(pending, results):
+            if place_data is None:
+                place_data = await self.click_place_details(card, details)
+            if self.save_place(place_data):
+                saved += 1
+        return saved
 
     async def monitor_scrolling(self):
         last_height = 0
@@ -181,6 +393,9 @@ class GoogleMapsExtractor:
         no_new_results_count = 0
         processed_count = 0
 
+        # Share the browser session (consent cookies etc.) with direct place page fetches
+        self.client.cookies.update({c['name']: c['value'] for c in self.driver.get_cookies()})
+
         while retries < MAX_RETRIES and no_new_results_count < 3:
             try:
                 scrollable_div = self.wait_for_element(By.CSS_SELECTOR, 'div[role="feed"]')
@@ -188,33 +403,19 @@ class GoogleMapsExtractor:
                     self.logger.error("Scrollable results panel not found")
                     break
 
-                # Get all cards
-                cards = self.driver.find_elements(By.CSS_SELECTOR, 'div.Nv2PK')
-                
-                # Process only new cards
-                new_cards = cards[self.last_processed_index:]
+                # Fetch only cards we haven't processed yet
+                new_cards = self.driver.execute_script(NEW_CARDS_SCRIPT, self.last_processed_index)
                 if new_cards:
-                    for card in new_cards:
-                        place_data = await self.extract_place_details(card)
-                        if place_data:
-                            if self.save_place(place_data):
-                                processed_count += 1
-                    
-                    self.last_processed_index = len(cards)
+                    processed_count += await self.process_cards(new_cards)
+                    self.last_processed_index += len(new_cards)
                     no_new_results_count = 0
                 else:
                     no_new_results_count += 1
 
-                # Smooth scrolling
-                current_height = self.driver.execute_script(
-                    "return arguments[0].scrollTop",
-                    scrollable_div
-                )
-                target_height = current_height + SCROLL_INCREMENT
-                
+                # Smooth scrolling: read and advance scrollTop in one round-trip
                 self.driver.execute_script(
-                    f"arguments[0].scrollTop = {target_height}",
-                    scrollable_div
+                    "arguments[0].scrollTop += arguments[1]",
+                    scrollable_div, SCROLL_INCREMENT
                 )
                 await asyncio.sleep(SCROLL_PAUSE_TIME)
 
@@ -224,7 +425,7 @@ class GoogleMapsExtractor:
                 )
 
                 if new_height == last_height:
-                    self.logger.info(f"Reached bottom, waiting for new results... (Processed: {processed_count})")
+                    self.logger.info("Reached bottom, waiting for new results... (Processed: %d)", processed_count)
                     await asyncio.sleep(WAIT_FOR_NEW_RESULTS)
                     
                     updated_height = self.driver.execute_script(
@@ -242,11 +443,11 @@ class GoogleMapsExtractor:
                     retries = 0
 
             except Exception as e:
-                self.logger.error(f"Error during scrolling: {e}")
+                self.logger.error("Error during scrolling: %s", e)
                 retries += 1
                 await asyncio.sleep(2)
 
-        self.logger.info(f"Extraction completed. Total places processed: {processed_count}")
+        self.logger.info("Extraction completed. Total places processed: %d", processed_count)
 
 def open_browser(url):
     options = Options()
@@ -255,7 +456,7 @@ def open_browser(url):
     options.add_argument('--disable-gpu')
     options.add_argument('--window-size=1920,1080')
     options.add_argument('--disable-blink-features=AutomationControlled')
-    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+    options.add_argument(f'--user-agent={USER_AGENT}')
 
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option("useAutomationExtension", False)
@@ -284,6 +485,7 @@ async def main():
     except KeyboardInterrupt:
         print("\nScript interrupted. Saving data...")
     finally:
+        await extractor.close()
         driver.quit()
 
 if __name__ == "__main__":